@@ -1,7 +1,12 @@
 
+import pathlib
+import tempfile
+import time
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import polars as pl
 
 st.set_page_config(page_title="Main Findings Dashboard", layout="wide")
 
@@ -11,10 +16,77 @@ st.caption("A concise, presentation-ready dashboard showing only the key results
 # -----------------------------
 # Data (default: OWID CO₂)
 # -----------------------------
+KEEP_COLS = ["country","year","iso_code","co2","co2_per_capita","population"]
+REQUIRED_COLS = ["country","year","co2","co2_per_capita"]
+
+def clean(df):
+    # narrow to the columns used below and fix dtypes once, so reruns scan a small frame
+    for col in REQUIRED_COLS:
+        if col not in df.columns:
+            raise ValueError(f"Missing required column: {col}")
+    df = df[[c for c in KEEP_COLS if c in df.columns]]
+    df = df.dropna(subset=["country","year"])
+    # aggregate rows (World, international transport, ...) are fixed, so flag them once
+    is_agg = df["country"].str.contains("World|International", case=False, na=False)
+    if "iso_code" in df.columns:
+        is_agg |= df["iso_code"].isin(["OWID_WRL","OWID_KOS"])
+    # narrow dtypes halve the bytes every filter/aggregation has to scan; int16 would
+    # silently wrap out-of-range uploads (e.g. YYYYMM codes), so reject those instead
+    year_range = np.iinfo(np.int16)
+    if pd.api.types.is_numeric_dtype(df["year"]) and len(df) and (
+        df["year"].min() < year_range.min or df["year"].max() > year_range.max
+    ):
+        raise ValueError(f"Column 'year' must hold plain years between {year_range.min} and {year_range.max}")
+    dtypes = {"year":"int16","co2":"float32","co2_per_capita":"float32"}
+    if "population" in df.columns:
+        dtypes["population"] = "float32"
+    # population threshold for the per-capita ranking; kept when population is absent
+    pop_ge_1m = df["population"].fillna(0) > 1_000_000 if "population" in df.columns else True
+    df = df.astype(dtypes).assign(is_agg=is_agg, pop_ge_1m=pop_ge_1m)
+    # sorted by (country, year) so every per-country slice is already in year order
+    return df.sort_values(["country","year"], kind="mergesort").reset_index(drop=True)
+
+# cleaned copy of the default dataset, so cold starts skip the download and CSV parse
+# bump the file version whenever clean() changes the stored columns
+PARQUET_CACHE = pathlib.Path(tempfile.gettempdir()) / "owid_co2.v3.parquet"
+PARQUET_MAX_AGE = 7 * 24 * 3600  # seconds; refetch weekly to pick up OWID updates
+
 @st.cache_data(show_spinner=False)
 def load_default():
+    if PARQUET_CACHE.exists() and time.time() - PARQUET_CACHE.stat().st_mtime < PARQUET_MAX_AGE:
+        try:
+            return pd.read_parquet(PARQUET_CACHE)
+        except Exception:
+            # truncated or unreadable copy: drop it and fall through to the download
+            PARQUET_CACHE.unlink(missing_ok=True)
     url = "https://raw.githubusercontent.com/owid/co2-data/master/owid-co2-data.csv"
-    return pd.read_csv(url)
+    # polars' multithreaded parser, reading only the columns the dashboard uses
+    df = pl.read_csv(
+        url,
+        columns=KEEP_COLS,
+        schema_overrides={"year":pl.Int16,"co2":pl.Float32,"co2_per_capita":pl.Float32,"population":pl.Float32},
+    )
+    df = clean(df.to_pandas())
+    try:
+        # per-writer temp file, so concurrent processes never rename a half-written file into place
+        with tempfile.NamedTemporaryFile(dir=PARQUET_CACHE.parent, suffix=".tmp", delete=False) as f:
+            tmp = pathlib.Path(f.name)
+        try:
+            df.to_parquet(tmp, compression="zstd")
+            tmp.replace(PARQUET_CACHE)
+        finally:
+            tmp.unlink(missing_ok=True)
+    except OSError:
+        pass  # the on-disk copy is only an optimisation
+    return df
+
+# per-dataset caches hold whole lookup structures; bound them so uploads don't pile up
+MAX_DATASETS = 4
+
+@st.cache_data(show_spinner=False, max_entries=MAX_DATASETS)
+def load_upload(_file, key):
+    # keyed by the upload's file_id so cleaning runs once per upload, not per rerun
+    return clean(pd.read_csv(_file))
 
 use_default = st.toggle("Use default OWID dataset", value=True, help="Turn off to upload your own CSV.")
 file = None if use_default else st.file_uploader("Upload CSV with columns at least: country, year, co2, co2_per_capita, population (optional)", type=["csv"])
@@ -29,19 +101,97 @@ else:
     if file is None:
         st.info("Upload a CSV to continue.")
         st.stop()
-    co2 = pd.read_csv(file)
-
-# basic clean
-for col in ["country","year","co2","co2_per_capita"]:
-    if col not in co2.columns:
-        st.error(f"Missing required column: {col}")
+    try:
+        co2 = load_upload(file, file.file_id)
+    except ValueError as e:
+        st.error(str(e))
         st.stop()
-co2 = co2.dropna(subset=["country","year"]).copy()
-co2["year"] = co2["year"].astype(int)
+
+# datasets are keyed by source so cached helpers below can skip hashing the frame itself
+data_key = "owid" if use_default else file.file_id
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_DATASETS)
+def year_groups(_df, key):
+    # one pass over the frame; per-year access below is then a dict lookup
+    return {y: g for y, g in _df.groupby("year", sort=True)}
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_DATASETS)
+def country_series(_df, key):
+    # (years, co2) arrays per country, so the trend chart only slices numpy arrays;
+    # clean() leaves the frame sorted by (country, year), so no per-country sort is needed
+    return {c: (g["year"].to_numpy(), g["co2"].to_numpy()) for c, g in _df.groupby("country", sort=False)}
+
+@st.cache_data(show_spinner=False, max_entries=MAX_DATASETS)
+def country_options(_df, key):
+    options = np.sort(_df["country"].unique()).tolist()
+    return options, {c: i for i, c in enumerate(options)}
+
+def top10_by_year(lf, col):
+    q = (lf.filter(pl.col(col).is_not_null())
+           .sort(col, descending=True, maintain_order=True)
+           .group_by("year", maintain_order=True).head(10)
+           .select("year", "country", col)
+           .collect())
+    return {y: g.drop("year").to_pandas() for (y,), g in q.partition_by("year", as_dict=True).items()}
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_DATASETS)
+def rankings(_df, key):
+    # every year's top 10 from one fused polars filter + sort + head plan, instead of per rerun
+    lf = pl.from_pandas(_df).lazy().filter(~pl.col("is_agg"))
+    return top10_by_year(lf, "co2"), top10_by_year(lf.filter(pl.col("pop_ge_1m")), "co2_per_capita")
+
+co2_by_year = year_groups(co2, data_key)
+series_by_country = country_series(co2, data_key)
+country_list, country_index = country_options(co2, data_key)
+top_co2, top_per_capita = rankings(co2, data_key)
+
+def get_year(year):
+    return co2_by_year.get(year, co2.iloc[:0])
+
+def topk(df, col, k):
+    # partial sort: find the k-th largest value in O(N), then only the k winners get ordered.
+    # Ties at the boundary take the earliest rows and the final sort is stable over input
+    # order, matching nlargest(keep="first").
+    df = df[df[col].notna()]
+    v = -df[col].to_numpy()
+    if len(v) > k:
+        kth = np.partition(v, k - 1)[k - 1]
+        better = np.flatnonzero(v < kth)
+        ties = np.flatnonzero(v == kth)[:k - len(better)]
+        idx = np.sort(np.concatenate([better, ties]))
+        idx = idx[np.argsort(v[idx], kind="stable")]
+    else:
+        idx = np.argsort(v, kind="stable")
+    return df.iloc[idx]
+
+def ranking_columns(col, label, fmt, max_value):
+    # country + in-cell bar for a top-10 table; an empty year still needs a positive scale
+    max_value = float(max_value) if pd.notna(max_value) and max_value > 0 else 1.0
+    return {
+        "country": st.column_config.TextColumn("Country"),
+        col: st.column_config.ProgressColumn(label, format=fmt, min_value=0, max_value=max_value),
+    }
+
+@st.cache_data(show_spinner=False, max_entries=MAX_DATASETS * 300)  # ~one entry per year
+def top8_for_year(key, year):
+    # tab9's comparison pool only depends on the ranking year, not on its own widgets
+    return topk(get_year(year), "co2", 8)["country"].tolist()
+
+def trend_frame(focus, comps, yr_min, yr_max):
+    # wide year x country frame for st.line_chart, built from the presorted per-country arrays
+    cols = {}
+    for c in sorted(set([focus] + comps)):
+        yrs, vals = series_by_country[c]
+        mask = (yrs >= yr_min) & (yrs <= yr_max)
+        if mask.any():
+            # years as dates, so Vega-Lite labels the axis 1950 rather than 1,950
+            dates = (yrs[mask].astype(np.int64) - 1970).astype("datetime64[Y]").astype("datetime64[s]")
+            cols[c] = pd.Series(vals[mask], index=dates)
+    return pd.DataFrame(cols).rename_axis("Year")
 
 # filters (limited to keep it 'findings-only')
 min_year, max_year = int(co2["year"].min()), int(co2["year"].max())
-default_focus = "China" if "China" in set(co2["country"]) else co2["country"].iloc[0]
+default_focus = "China" if "China" in country_index else country_list[0]
 
 
 # Tabs correspond to key findings sections only
@@ -55,25 +205,20 @@ tab8, tab9, tab10 = st.tabs(
 with tab8:
     year_for_rank = st.slider("Select ranking year", min_value=min_year, max_value=max_year, value=min(2014, max_year))
     st.subheader(f"Top 10 CO₂ Emitters — {year_for_rank}")
-    d = co2[co2["year"] == year_for_rank].copy()
-    d = d[~d["country"].str.contains("World|International", case=False, na=False)]
-    if "iso_code" in d.columns:
-        d = d[~d["iso_code"].isin(["OWID_WRL","OWID_KOS"])]
-    d = d.dropna(subset=["co2"])
-    top = d.nlargest(10, "co2")[["country","co2"]]
+    # the metrics only read co2, so select that one column instead of copying the frame twice
+    d = get_year(year_for_rank)
+    d_co2 = d.loc[~d["is_agg"] & d["co2"].notna(), "co2"]
+    top = top_co2.get(year_for_rank, pd.DataFrame(columns=["country","co2"]))
 
     col1, col2 = st.columns([2,1])
     with col1:
-        fig = plt.figure()
-        plt.barh(top["country"][::-1], top["co2"][::-1])
-        plt.xlabel("CO₂ (million tonnes)")
-        plt.ylabel("Country")
-        plt.title(f"Top 10 Emitters — {year_for_rank}")
-        st.pyplot(fig, clear_figure=True)
+        # bars are drawn client-side by the progress column; no chart or Styler pass per rerun
+        st.dataframe(top, column_config=ranking_columns("co2", "CO₂ (Mt)", "%.0f", top["co2"].max()),
+                     use_container_width=True, hide_index=True)
     with col2:
-        st.metric("World CO₂ (Mt)", value=f"{d['co2'].sum():,.0f}")
-        st.metric("Median CO₂ (Mt)", value=f"{d['co2'].median():,.0f}")
-        st.dataframe(top.rename(columns={"country":"Country","co2":"CO₂ (Mt)"}).style.format({"CO₂ (Mt)":"{:.0f}"}), use_container_width=True)
+        arr = d_co2.to_numpy(dtype=np.float32, copy=False)
+        st.metric("World CO₂ (Mt)", value=f"{arr.sum(dtype=np.float64):,.0f}")
+        st.metric("Median CO₂ (Mt)", value=f"{np.median(arr) if arr.size else np.nan:,.0f}")
 
     st.markdown("""
     **Key Takeaways:**
@@ -87,26 +232,19 @@ with tab8:
 # -----------------------------
 with tab9:
     st.subheader("CO₂ Emissions Over Time — China")
-    focus_country = st.selectbox("China", sorted(co2["country"].unique()), index=sorted(co2["country"].unique()).index(default_focus) if default_focus in set(co2["country"]) else 0)
+    focus_country = st.selectbox("China", country_list, index=country_index.get(default_focus, 0))
     # choose comparison set: top 7 emitters in the selected ranking year
-    pool = co2[co2["year"] == year_for_rank].nlargest(8, "co2")["country"].tolist()
+    pool = top8_for_year(data_key, year_for_rank)
     comps = [c for c in pool if c != focus_country][:5]
     st.caption(f"Comparing {focus_country} to: {', '.join(comps) if comps else '—'}")
     yr_min, yr_max = st.slider("Show years", min_value=min_year, max_value=max_year, value=(max(min_year, 1950), max_year))
 
-    dd = co2[(co2["year"] >= yr_min) & (co2["year"] <= yr_max)].copy()
-    subset = dd[dd["country"].isin([focus_country] + comps)]
-    fig = plt.figure()
-    for c in subset["country"].unique():
-        s = subset[subset["country"] == c].sort_values("year")
-        if c == focus_country:
-            plt.plot(s["year"], s["co2"], linewidth=3)
-        else:
-            plt.plot(s["year"], s["co2"], linewidth=1)
-    plt.xlabel("Year")
-    plt.ylabel("CO₂ (million tonnes)")
-    plt.title(f"CO₂ over Time — Highlight: {focus_country}")
-    st.pyplot(fig, clear_figure=True)
+    trend = trend_frame(focus_country, comps, yr_min, yr_max)
+    st.markdown(f"**CO₂ over Time — Highlight: {focus_country}**")
+    # focus country in a strong colour, comparisons muted
+    muted = iter(["#9ecae1","#a1d99b","#fdd0a2","#bcbddc","#d9d9d9"])
+    st.line_chart(trend, x_label="Year", y_label="CO₂ (million tonnes)",
+                  color=["#d62728" if c == focus_country else next(muted) for c in trend.columns] or None)
 
     st.markdown("""
     **Key Takeaways:**
@@ -126,31 +264,14 @@ with tab10:
         key="year_pc_slider"
     )
 
-    d_pc = co2[co2["year"] == year_pc].copy()
-    # remove aggregates and tiny populations
-    if "iso_code" in d_pc.columns:
-        d_pc = d_pc[~d_pc["iso_code"].isin(["OWID_WRL","OWID_KOS"])]
-    d_pc = d_pc[~d_pc["country"].str.contains("World|International", case=False, na=False)]
-    if "population" in d_pc.columns:
-        d_pc = d_pc[d_pc["population"] > 1_000_000]
-
-    d_pc = d_pc.dropna(subset=["co2_per_capita"])
-    top_pc = d_pc.nlargest(10, "co2_per_capita")[["country", "co2_per_capita"]]
-
-    c1, c2 = st.columns([2,1])
-    with c1:
-        fig = plt.figure()
-        plt.barh(top_pc["country"][::-1], top_pc["co2_per_capita"][::-1])
-        plt.xlabel("Tonnes per person")
-        plt.ylabel("Country")
-        plt.title(f"Top 10 per-capita — {year_pc}")
-        st.pyplot(fig, clear_figure=True)
-    with c2:
-        st.dataframe(
-            top_pc.rename(columns={"country":"Country","co2_per_capita":"Tonnes/person"})
-                  .style.format({"Tonnes/person":"{:.2f}"}),
-            use_container_width=True
-        )
+    # aggregates and tiny populations are already excluded from the precomputed rankings
+    top_pc = top_per_capita.get(year_pc, pd.DataFrame(columns=["country","co2_per_capita"]))
+
+    st.dataframe(
+        top_pc,
+        column_config=ranking_columns("co2_per_capita", "Tonnes/person", "%.2f", top_pc["co2_per_capita"].max()),
+        use_container_width=True, hide_index=True
+    )
 
     st.markdown("""
 **Key Takeaways:**